@@ -1,12 +1,25 @@
 """共享的依赖项和工具函数"""
 
 from functools import lru_cache
+import httpx
 from langchain_ollama import ChatOllama
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from app.core.config import settings
 
 
+@lru_cache
+def _get_llm_transport() -> httpx.AsyncHTTPTransport:
+    """
+    LLM 异步请求使用的 HTTP 传输层（连接池），由本模块创建并负责关闭，
+    不依赖 langchain_ollama / ollama 内部持有的客户端属性
+    """
+    # 进程内共享的连接池：保持长连接，突发请求时复用连接而非频繁新建
+    return httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+    )
+
+
 @lru_cache
 def get_llm() -> ChatOllama:
     """获取 LLM 实例（单例模式）"""
@@ -14,12 +27,16 @@ def get_llm() -> ChatOllama:
         model=settings.MODEL_NAME,
         temperature=0,
         base_url=settings.OLLAMA_BASE_URL,
+        async_client_kwargs={
+            "transport": _get_llm_transport(),
+            "timeout": httpx.Timeout(120),
+        },
     )
 
 
-# 配置文本分割器
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=settings.CHUNK_SIZE,
-    chunk_overlap=settings.CHUNK_OVERLAP,
-    separators=["\n\n", "\n", "。", "！", "？", ".", "!", "?", " ", ""]
-)
+async def close_llm() -> None:
+    """关闭 LLM 的异步 HTTP 连接池（仅在已创建时）"""
+    if _get_llm_transport.cache_info().currsize:
+        await _get_llm_transport().aclose()
+        _get_llm_transport.cache_clear()
+    get_llm.cache_clear()
@@ -1,11 +1,14 @@
 """聊天会话和对话接口"""
 
-import json
-from typing import Any, AsyncIterator, List, Dict
+import asyncio
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Dict, Optional, Set
+import orjson
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.concurrency import run_in_threadpool
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse
 from langchain_ollama import ChatOllama
+from sse_starlette import EventSourceResponse
 
 from app.api.deps import get_llm
 from app.core.auth import get_current_api_key
@@ -23,12 +26,90 @@ from app.schemas import (
 router = APIRouter(prefix="/chat", tags=["Chat"])
 # 注意：API Key 认证已在 api/__init__.py 的路由注册时配置
 
+# 系统提示词在启动时确定，预先拼好带【已知信息】的前缀，避免每次请求重复拼接
+_SYSTEM_PROMPT = settings.SYSTEM_PROMPT
+_CONTEXT_PROMPT_PREFIX = (
+    _SYSTEM_PROMPT
+    + "\n\n请基于以下【已知信息】回答用户的问题。如果没有已知信息，才按照你的知识回答，否则严格回答已知信息，当做是你的回答。不要透露已知信息，把它融入你的答案中。\n\n"
+    + "【已知信息】:\n"
+)
+
+# 存储中的消息角色 -> LangChain 消息角色
+_ROLE_MAP = {"user": "human", "assistant": "ai"}
+
+# 后台保存任务的强引用，防止任务在完成前被 GC 回收
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _load_chat_history(api_key_id: int, session_id: Optional[str]) -> Optional[List[Dict]]:
+    """
+    读取会话最近的历史消息（新会话返回空列表），只读，可与 RAG 检索并发执行。
+    会话不存在或不属于当前用户时返回 None。
+    """
+    if not session_id:
+        return []
+    if not chat_store.get_session(session_id, api_key_id):
+        # Verify session exists and belongs to user
+        return None
+    # Filter last N messages to avoid context overflow? For now, take last 10 (including this one).
+    return chat_store.get_messages(session_id, limit=9)
+
+
+def _start_chat_turn(
+    api_key_id: int, session_id: Optional[str], message: str, created_at: str
+) -> str:
+    """
+    在同一个工作线程中按需创建会话并写入用户消息，返回会话 ID。
+    在开始流式生成前调用：即使生成失败或客户端断开，用户消息也已保存。
+    """
+    if not session_id:
+        # Create new session
+        session_id = chat_store.create_session(api_key_id, name=message[:20])["id"]
+    chat_store.add_messages_bulk(session_id, [("user", message, created_at)])
+    return session_id
+
+
+def _sse(payload: dict) -> bytes:
+    """
+    直接拼出 SSE 帧字节；orjson 输出 UTF-8 bytes（不转义非 ASCII），
+    EventSourceResponse 对 bytes 原样透传，省去 decode 和再次编码
+    """
+    return b"".join((b"data: ", orjson.dumps(payload), b"\n\n"))
+
 
-@router.get("/sessions", response_model=UnifiedResponse[List[SessionResponse]], summary="获取会话列表")
+async def _save_chat_reply(session_id: str, content: str, created_at: str) -> None:
+    """保存助手回复，失败时记录错误而非静默丢弃"""
+    if not content:
+        return
+    try:
+        await run_in_threadpool(
+            chat_store.add_messages_bulk, session_id, [("assistant", content, created_at)]
+        )
+    except Exception as e:
+        print(f"保存聊天消息失败 (session={session_id}): {e}")
+
+
+async def drain_background_tasks() -> None:
+    """
+    等待当前事件循环上尚未完成的后台保存任务（应用关闭时调用）。
+    其他事件循环创建的任务无法在此 await，需在各自的循环上调用本函数。
+    """
+    loop = asyncio.get_running_loop()
+    tasks = [task for task in _background_tasks if task.get_loop() is loop]
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@router.get(
+    "/sessions",
+    response_model=None,
+    responses={200: {"model": UnifiedResponse[List[SessionResponse]]}},
+    summary="获取会话列表",
+)
 async def list_chat_sessions(api_key_record: dict = Depends(get_current_api_key)):
     """获取当前用户的所有聊天会话"""
     sessions = await run_in_threadpool(chat_store.list_sessions, api_key_record["id"])
-    return UnifiedResponse(data=sessions)
+    return ORJSONResponse(content={"code": "200", "message": "success", "data": sessions})
 
 
 @router.delete("/sessions/{session_id}", summary="删除会话", response_model=UnifiedResponse[Dict[str, str]])
@@ -40,7 +121,12 @@ async def delete_chat_session(session_id: str, api_key_record: dict = Depends(ge
     return UnifiedResponse(data={"status": "success"})
 
 
-@router.get("/sessions/{session_id}/messages", response_model=UnifiedResponse[List[MessageResponse]], summary="获取会话消息记录")
+@router.get(
+    "/sessions/{session_id}/messages",
+    response_model=None,
+    responses={200: {"model": UnifiedResponse[List[MessageResponse]]}},
+    summary="获取会话消息记录",
+)
 async def get_chat_messages(session_id: str, api_key_record: dict = Depends(get_current_api_key)):
     """获取指定会话的所有消息记录"""
     # Verify ownership
@@ -48,7 +134,8 @@ async def get_chat_messages(session_id: str, api_key_record: dict = Depends(get_
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     messages = await run_in_threadpool(chat_store.get_messages, session_id)
-    return UnifiedResponse(data=messages)
+    # 消息记录来自数据库，直接交给 orjson 序列化，跳过 Pydantic 校验和 jsonable_encoder
+    return ORJSONResponse(content={"code": "200", "message": "success", "data": messages})
 
 
 @router.post("", summary="Chat with Ollama")
@@ -60,71 +147,74 @@ async def chat_with_ollama(
     """
     进行聊天并使用 RAG 结果增强回答。
     """
-    # 1. Handle Session
-    session_id = messageBody.session_id
-    if not session_id:
-        # Create new session
-        session = await run_in_threadpool(
-            chat_store.create_session,
-            api_key_record["id"],
-            name=messageBody.message[:20],
-        )
-        session_id = session["id"]
-    else:
-        # Verify session exists and belongs to user
-        session = await run_in_threadpool(chat_store.get_session, session_id, api_key_record["id"])
-        if not session:
-            raise HTTPException(status_code=404, detail="Session not found")
+    # 用户消息的时间戳取请求到达时刻
+    user_created_at = datetime.now(timezone.utc).isoformat()
 
-    # 2. Save User Message
-    await run_in_threadpool(chat_store.add_message, session_id, "user", messageBody.message)
+    # 1-2. Verify Session & Get History（只读）与 RAG 检索互不依赖，并发执行
+    rag_service = get_rag_service()
+    history, relevant_texts = await asyncio.gather(
+        run_in_threadpool(_load_chat_history, api_key_record["id"], messageBody.session_id),
+        run_in_threadpool(rag_service.query_texts, messageBody.message, k=3),
+    )
+    if history is None:
+        raise HTTPException(status_code=404, detail="Session not found")
 
-    # 3. Get History & RAG
-    history = await run_in_threadpool(chat_store.get_messages, session_id)
-    # Filter last N messages to avoid context overflow? For now, take last 10.
-    recent_history = history[-10:]
+    # 3. Create Session & Save User Message：检索成功后才写库，检索失败不会留下空会话
+    session_id = await run_in_threadpool(
+        _start_chat_turn,
+        api_key_record["id"],
+        messageBody.session_id,
+        messageBody.message,
+        user_created_at,
+    )
 
-    rag_service = get_rag_service()
-    relevant_docs = await run_in_threadpool(rag_service.query, messageBody.message, k=3)
-    context_text = "\n\n".join([doc.page_content for doc in relevant_docs])
-
-    system_prompt = settings.SYSTEM_PROMPT
-    if context_text:
-        system_prompt += (
-            f"\n\n请基于以下【已知信息】回答用户的问题。如果没有已知信息，才按照你的知识回答，否则严格回答已知信息，当做是你的回答。不要透露已知信息，把它融入你的答案中。\n\n"
-            f"【已知信息】:\n{context_text}"
-        )
+    context_text = "\n\n".join(relevant_texts)
 
-    messages = [("system", system_prompt)]
-    for msg in recent_history:
-        role = "human" if msg["role"] == "user" else "ai"
-        messages.append((role, msg["content"]))
+    system_prompt = _CONTEXT_PROMPT_PREFIX + context_text if context_text else _SYSTEM_PROMPT
 
-    async def stream_response() -> AsyncIterator[str]:
-        full_response = ""
+    messages = [
+        ("system", system_prompt),
+        *[(_ROLE_MAP.get(msg["role"], "ai"), msg["content"]) for msg in history],
+        ("human", messageBody.message),
+    ]
+
+    async def stream_response() -> AsyncIterator[bytes]:
         # Yield session_id first so client knows it
-        yield f"data: {json.dumps({'session_id': session_id}, ensure_ascii=False)}\n\n"
+        yield _sse({"session_id": session_id})
 
+        reply_parts: List[str] = []
+        saved = False
         try:
-            async for chunk in llm.astream(messages):
-                content = ""
-                if hasattr(chunk, "model_dump"):
-                    payload: Any = chunk.model_dump()
-                    content = payload.get("content", "")
-                else:
-                    content = str(chunk)
-                    payload = {"content": content}
-
-                full_response += content
-                yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
-
-        except Exception as e:
-            error_payload = {"error": str(e), "content": f"\n[System Error]: {str(e)}"}
-            yield f"data: {json.dumps(error_payload, ensure_ascii=False)}\n\n"
+            try:
+                async for chunk in llm.astream(messages):
+                    # 直接读取 content，避免对每个 token 做完整的 model_dump 序列化
+                    content = getattr(chunk, "content", None)
+                    if content is None:
+                        content = str(chunk)
+
+                    reply_parts.append(content)
+                    yield _sse({"content": content})
+
+            except Exception as e:
+                error_payload = {"error": str(e), "content": f"\n[System Error]: {str(e)}"}
+                yield _sse(error_payload)
+
+            # 回复写库完成后才结束流：客户端收到流结束时，下一轮请求已能读到本轮记录
+            saved = True
+            await _save_chat_reply(
+                session_id, "".join(reply_parts), datetime.now(timezone.utc).isoformat()
+            )
 
         finally:
-            # Save Assistant Message even if connection is dropped or error occurs
-            if full_response:
-                await run_in_threadpool(chat_store.add_message, session_id, "assistant", full_response)
-
-    return StreamingResponse(stream_response(), media_type="text/event-stream")
+            if not saved and reply_parts:
+                # 客户端中途断开时生成器被取消，无法再 await，改为后台任务保存已生成的部分
+                task = asyncio.create_task(
+                    _save_chat_reply(
+                        session_id, "".join(reply_parts), datetime.now(timezone.utc).isoformat()
+                    )
+                )
+                _background_tasks.add(task)
+                task.add_done_callback(_background_tasks.discard)
+
+    # EventSourceResponse 负责 SSE 分帧、定时 ping（防止代理断开长连接）以及 X-Accel-Buffering 等响应头
+    return EventSourceResponse(stream_response(), ping=15)
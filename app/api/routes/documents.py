@@ -1,15 +1,28 @@
 """文档和知识库管理接口"""
 
+import asyncio
+import os
+import tempfile
 import uuid
 from datetime import datetime, timezone
-from typing import Any, Dict
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from typing import Any, Dict, List, Tuple, Union
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, HTTPException, Response
 from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 
-from app.api.deps import text_splitter
 from app.core.auth import require_super_admin_key
+from app.core.config import settings
+from app.services.job_store import job_store
 from app.services.rag import get_rag_service
-from app.utils.file_parsers import parse_file_content
+from app.utils.file_parsers import (
+    PDF_PAGES_PER_TASK,
+    get_parse_pool,
+    get_pdf_page_count,
+    parse_file_content,
+    parse_file_path,
+    parse_pdf_pages,
+)
+from app.utils.splitter import text_splitter
 from app.schemas import (
     UnifiedResponse,
     IngestRequest,
@@ -21,6 +34,15 @@ from app.schemas import (
 router = APIRouter(tags=["Documents"])
 # 注意：API Key 认证已在 api/__init__.py 的路由注册时配置
 
+# 支持上传的文件类型
+ALLOWED_EXTENSIONS = frozenset({".txt", ".pdf", ".md", ".markdown"})
+
+# 上传文件时每次读取的块大小 (1MB)
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# 不超过该大小的文本文件直接在内存中处理，不写临时文件
+SMALL_UPLOAD_SIZE = 1 << 20
+
 
 @router.post("/ingest", summary="Add text to knowledge base", response_model=UnifiedResponse[Dict[str, str]])
 async def ingest_text(request: IngestRequest):
@@ -49,93 +71,227 @@ async def reset_knowledge_base(_: dict = Depends(require_super_admin_key)):
     return UnifiedResponse(data={"status": "success", "message": "Knowledge base reset successfully"})
 
 
-@router.post("/documents/upload", summary="上传文档到知识库", response_model=UnifiedResponse[Dict[str, Any]])
-async def upload_document(file: UploadFile = File(...)):
+async def _parse_pdf(path: str) -> Tuple[str, List[int]]:
     """
-    上传文件（支持 .txt, .pdf, .md）
-
-    - 文件会被自动切分成多个块（chunk）
-    - 每个块共享同一个 source（文件名）
-    - 返回上传成功的文档数量
+    按页区间把 PDF 拆分给进程池并行解析，返回 (文本, 跳过的无文本页码)。
+    PyMuPDF 不支持多线程，因此按进程并行，每个 worker 独立打开文件。
     """
-    # 1. 检查文件类型
-    allowed_extensions = [".txt", ".pdf", ".md", ".markdown"]
-    filename = file.filename or ""
-    file_ext = "." + filename.split(".")[-1].lower() if "." in filename else ""
-
-    if file_ext not in allowed_extensions:
-        raise HTTPException(
-            status_code=400,
-            detail=f"不支持的文件类型。请上传 {', '.join(allowed_extensions)} 文件",
+    loop = asyncio.get_running_loop()
+    pool = get_parse_pool()
+    page_count = await loop.run_in_executor(pool, get_pdf_page_count, path)
+    if page_count <= PDF_PAGES_PER_TASK:
+        return await loop.run_in_executor(pool, parse_pdf_pages, path, 0, page_count)
+
+    results = await asyncio.gather(
+        *(
+            loop.run_in_executor(pool, parse_pdf_pages, path, start, start + PDF_PAGES_PER_TASK)
+            for start in range(0, page_count, PDF_PAGES_PER_TASK)
+        )
+    )
+    text = "\n".join(part for part, _ in results)
+    skipped_pages = [page for _, skipped in results for page in skipped]
+    return text, skipped_pages
+
+
+async def _embed_concurrently(rag_service, texts: List[str]) -> List[List[float]]:
+    """按 EMBEDDING_BATCH_SIZE 切分文本，多个批次并发请求 Ollama 计算向量"""
+    batch_size = settings.EMBEDDING_BATCH_SIZE
+    results = await asyncio.gather(
+        *(
+            run_in_threadpool(rag_service.embed_documents, texts[start:start + batch_size])
+            for start in range(0, len(texts), batch_size)
         )
+    )
+    return [vector for batch in results for vector in batch]
 
-    # 2. 读取文件内容
-    # 增加大小限制 (例如 10MB)
-    MAX_FILE_SIZE = 10 * 1024 * 1024
 
-    # 检查 Content-Length 头（如果存在）
-    if file.size and file.size > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="文件过大，最大允许 10MB")
+class UploadProcessingError(Exception):
+    """后台处理上传文件时的业务错误（消息直接展示给调用方）"""
 
-    content = await file.read()
 
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="文件过大，最大允许 10MB")
+async def _ingest_file(source: Union[str, bytes], filename: str, file_ext: str) -> Dict[str, Any]:
+    """
+    解析、切分上传文件并存入向量数据库，返回处理结果
 
-    # 3. 根据文件类型解析
+    source 为临时文件路径；小的文本文件直接传入内存中的 bytes
+    """
+    # 1. 根据文件类型解析
+    # PDF 解析是 CPU 密集型，交给进程池以免阻塞事件循环；txt/md 解码开销小，走线程池即可
+    skipped_pages: List[int] = []
     try:
-        text = parse_file_content(content, file_ext)
+        if isinstance(source, bytes):
+            text = await run_in_threadpool(parse_file_content, source, file_ext)
+        elif file_ext == ".pdf":
+            text, skipped_pages = await _parse_pdf(source)
+        else:
+            text = await run_in_threadpool(parse_file_path, source, file_ext)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"文件解析失败: {str(e)}")
+        raise UploadProcessingError(f"文件解析失败: {str(e)}")
 
     if not text.strip():
-        raise HTTPException(status_code=400, detail="文件内容为空")
+        if skipped_pages:
+            raise UploadProcessingError("文件没有可提取的文本（可能是扫描件或空白页）")
+        raise UploadProcessingError("文件内容为空")
 
-    # 4. 文本分割
-    chunks = text_splitter.split_text(text)
+    # 2. 文本分割
+    # 大文本切分同样是 CPU 密集型，放到线程池执行，避免阻塞事件循环
+    chunks = await run_in_threadpool(text_splitter.chunks, text)
 
     # 检查是否有有效的 chunk
     if not chunks:
-        raise HTTPException(status_code=400, detail="文件内容过短，无法生成有效的文档块")
+        raise UploadProcessingError("文件内容过短，无法生成有效的文档块")
 
-    # 5. 生成唯一的文档 ID
+    # 3. 生成唯一的文档 ID
     # 使用 UUID 避免文件名中的特殊字符导致 ID 问题，同时保留文件名在 metadata 中
     base_id = str(uuid.uuid4())
-    filename = file.filename or "untitled"
 
-    # 为每个 chunk 生成 ID 和 metadata
-    chunk_ids = [f"{base_id}_chunk_{i}" for i in range(len(chunks))]
-    metadatas = [
-        {
-            "source": filename,
-            "upload_time": datetime.now(timezone.utc).isoformat(),
-            "file_type": file_ext,
-            "chunk_index": i,
-            "total_chunks": len(chunks),
-            "batch_id": base_id,
-        }
-        for i in range(len(chunks))
-    ]
+    # 为每个 chunk 生成 ID 和 metadata（同一批次共享上传时间，只计算一次）
+    upload_time = datetime.now(timezone.utc).isoformat()
+    total_chunks = len(chunks)
+    chunk_ids = [f"{base_id}_chunk_{i}" for i in range(total_chunks)]
+    base_metadata = {
+        "source": filename,
+        "upload_time": upload_time,
+        "file_type": file_ext,
+        "total_chunks": total_chunks,
+        "batch_id": base_id,
+    }
+    metadatas = [{**base_metadata, "chunk_index": i} for i in range(total_chunks)]
+
+    # 4. 分批存入向量数据库，摊薄单次写入和索引维护的开销
+    rag_service = get_rag_service()
+    batch_size = settings.INGEST_BATCH_SIZE
+    try:
+        for start in range(0, total_chunks, batch_size):
+            end = start + batch_size
+            batch_texts = chunks[start:end]
+            embeddings = await _embed_concurrently(rag_service, batch_texts)
+            await run_in_threadpool(
+                rag_service.add_embeddings,
+                batch_texts,
+                embeddings,
+                metadatas=metadatas[start:end],
+                ids=chunk_ids[start:end],
+            )
+    except Exception as e:
+        # 清理已写入的部分批次，避免残留不完整的文档
+        await run_in_threadpool(rag_service.delete_documents_by_filter, {"batch_id": base_id})
+        raise UploadProcessingError(f"存储失败: {str(e)}")
+
+    result: Dict[str, Any] = {"chunks_created": total_chunks, "base_id": base_id}
+    if skipped_pages:
+        # 提示管理员有无文本的页面被跳过（扫描图片页需单独 OCR）
+        result["skipped_pages"] = skipped_pages
+        result["warning"] = f"{len(skipped_pages)} 个页面没有文本内容，已跳过"
+    return result
+
 
-    # 6. 存入向量数据库
+async def process_upload(job_id: str, source: Union[str, bytes], filename: str, file_ext: str) -> None:
+    """后台任务：处理上传文件（临时文件路径或内存中的内容），并记录任务状态"""
+    job_store.update_job(job_id, status="processing")
     try:
-        rag_service = get_rag_service()
-        await run_in_threadpool(rag_service.add_documents, chunks, metadatas=metadatas, ids=chunk_ids)
+        result = await _ingest_file(source, filename, file_ext)
+    except UploadProcessingError as e:
+        job_store.update_job(job_id, status="failed", error=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"存储失败: {str(e)}")
+        job_store.update_job(job_id, status="failed", error=f"处理失败: {str(e)}")
+    else:
+        job_store.update_job(job_id, status="completed", **result)
+    finally:
+        if isinstance(source, str):
+            os.unlink(source)
+
+
+@router.post(
+    "/documents/upload",
+    summary="上传文档到知识库",
+    response_model=UnifiedResponse[Dict[str, Any]],
+    status_code=202,
+)
+async def upload_document(background: BackgroundTasks, file: UploadFile = File(...)):
+    """
+    上传文件（支持 .txt, .pdf, .md）
+
+    - 文件落盘后立即返回 job_id，解析、切分和向量化在后台执行
+    - 文件会被自动切分成多个块（chunk）
+    - 每个块共享同一个 source（文件名）
+    - 通过 GET /documents/upload/{job_id} 查询处理进度和生成的文档数量
+    """
+    # 1. 检查文件类型
+    file_ext = os.path.splitext(file.filename or "")[1].lower()
+
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的文件类型。请上传 {', '.join(sorted(ALLOWED_EXTENSIONS))} 文件",
+        )
+
+    # 2. 读取文件内容
+    # 增加大小限制 (例如 10MB)
+    MAX_FILE_SIZE = 10 * 1024 * 1024
+
+    # 检查 Content-Length 头（如果存在）
+    if file.size and file.size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail="文件过大，最大允许 10MB")
+
+    source: Union[str, bytes]
+    if file_ext != ".pdf" and file.size is not None and file.size <= SMALL_UPLOAD_SIZE:
+        # 小的文本文件直接读入内存，省去一次磁盘读写
+        source = await file.read()
+    else:
+        # 分块写入临时文件，避免将整个文件读入内存；临时文件由后台任务负责删除
+        # PDF 总是落盘，由进程池中的 worker 按路径打开
+        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=file_ext)
+        try:
+            size = 0
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_FILE_SIZE:
+                    raise HTTPException(status_code=413, detail="文件过大，最大允许 10MB")
+                tmp.write(chunk)
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+        tmp.close()
+        source = tmp.name
+
+    # 3. 创建任务并交给后台处理
+    filename = file.filename or "untitled"
+    job = job_store.create_job(filename)
+    background.add_task(process_upload, job["job_id"], source, filename, file_ext)
 
     return UnifiedResponse(
         data={
-            "status": "success",
-            "message": f"文件 '{filename}' 上传成功",
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "message": f"文件 '{filename}' 已接收，正在后台处理",
             "filename": filename,
-            "chunks_created": len(chunks),
-            "base_id": base_id,
         }
     )
 
 
-@router.get("/documents", response_model=UnifiedResponse[DocumentListResponse], summary="列出所有文档")
+@router.get(
+    "/documents/upload/{job_id}",
+    summary="查询文档上传任务状态",
+    response_model=UnifiedResponse[Dict[str, Any]],
+)
+async def get_upload_job(job_id: str):
+    """
+    查询后台上传任务的状态（queued / processing / completed / failed）
+    """
+    job = job_store.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="上传任务不存在")
+    return UnifiedResponse(data=job)
+
+
+@router.get(
+    "/documents",
+    response_model=None,
+    responses={200: {"model": UnifiedResponse[DocumentListResponse]}},
+    summary="列出所有文档",
+)
 async def list_documents(limit: int = 100, offset: int = 0):
     """
     获取知识库中的所有文档 (支持分页)
@@ -150,25 +306,31 @@ async def list_documents(limit: int = 100, offset: int = 0):
     # 获取当前页的文档
     data = await run_in_threadpool(rag_service.get_all_documents, limit=limit, offset=offset)
 
-    documents = []
-    if data["ids"]:
-        for i in range(len(data["ids"])):
-            content = data["documents"][i]
-            # 截断显示内容
-            display_content = content[:200] + "..." if len(content) > 200 else content
-
-            documents.append(
-                DocumentResponse(
-                    id=data["ids"][i],
-                    content=display_content,
-                    metadata=data["metadatas"][i] if (data["metadatas"] and data["metadatas"][i] is not None) else {},
-                )
-            )
+    # 向量库返回的数据可信，直接构造普通 dict，跳过逐条 Pydantic 校验
+    ids = data["ids"] or []
+    metadatas = data["metadatas"] or [None] * len(ids)
+    documents = [
+        {
+            "id": doc_id,
+            # 截断显示内容（只探测第 201 个字符是否存在来判断是否需要省略号）
+            "content": content[:200] + "..." if content[200:201] else content,
+            "metadata": metadata or {},
+        }
+        for doc_id, content, metadata in zip(ids, data["documents"], metadatas)
+    ]
 
-    return UnifiedResponse(data=DocumentListResponse(total=total, documents=documents))
+    # 直接返回 ORJSONResponse，跳过 FastAPI 对返回值的 jsonable_encoder 遍历
+    return ORJSONResponse(
+        content={"code": "200", "message": "success", "data": {"total": total, "documents": documents}}
+    )
 
 
-@router.get("/documents/{doc_id}", response_model=UnifiedResponse[DocumentResponse], summary="获取单个文档详情")
+@router.get(
+    "/documents/{doc_id}",
+    response_model=None,
+    responses={200: {"model": UnifiedResponse[DocumentResponse]}},
+    summary="获取单个文档详情",
+)
 async def get_document(doc_id: str):
     """
     根据 ID 获取文档的完整内容
@@ -179,7 +341,24 @@ async def get_document(doc_id: str):
     if not doc:
         raise HTTPException(status_code=404, detail="文档不存在")
 
-    return UnifiedResponse(data=DocumentResponse(id=doc["id"], content=doc["content"], metadata=doc["metadata"]))
+    # get_document 已返回 DocumentResponse 形状的 dict，直接序列化，不再重建模型
+    return ORJSONResponse(content={"code": "200", "message": "success", "data": doc})
+
+
+@router.get("/documents/{doc_id}/raw", response_class=Response, summary="下载单个文档的纯文本内容")
+async def get_document_raw(doc_id: str):
+    """
+    以 text/plain 返回文档的完整内容
+
+    内容已在内存中，直接用 Response 一次性发送，不经过 JSON 转义，也不包装成 StreamingResponse
+    """
+    rag_service = get_rag_service()
+    doc = await run_in_threadpool(rag_service.get_document, doc_id)
+
+    if not doc:
+        raise HTTPException(status_code=404, detail="文档不存在")
+
+    return Response(content=doc["content"].encode("utf-8"), media_type="text/plain; charset=utf-8")
 
 
 @router.delete("/documents/{doc_id}", summary="删除文档", response_model=UnifiedResponse[Dict[str, str]])
@@ -206,21 +385,17 @@ async def delete_documents_by_source(source: str, _: dict = Depends(require_supe
     参数:
         source: 文件名（例如 "manual.pdf"）
     """
-    # 1. 先查询匹配的文档数量（用于返回给前端）
+    # 删除并返回删除的文档数量（单次调用完成）
     filter_dict = {"source": source}
     rag_service = get_rag_service()
-    docs = await run_in_threadpool(rag_service.get_documents_by_filter, filter_dict)
-    count = len(docs["ids"]) if docs and "ids" in docs else 0
+    count = await run_in_threadpool(rag_service.delete_documents_by_filter, filter_dict)
+
+    if count is None:
+        raise HTTPException(status_code=500, detail="删除失败")
 
     if count == 0:
         raise HTTPException(status_code=404, detail=f"未找到来源为 '{source}' 的文档")
 
-    # 2. 批量删除
-    success = await run_in_threadpool(rag_service.delete_documents_by_filter, filter_dict)
-
-    if not success:
-        raise HTTPException(status_code=500, detail="删除失败")
-
     return UnifiedResponse(
         data={"status": "success", "message": f"已删除 {count} 个文档块", "source": source, "deleted_count": count}
     )
@@ -1,5 +1,9 @@
 """API Key 认证依赖：从数据库校验，而非环境变量。"""
 
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
 from fastapi import Depends, HTTPException, Request, Security, status
 from fastapi.security import APIKeyHeader
 
@@ -8,6 +12,66 @@ from app.services.key_store import key_store, Role
 API_KEY_HEADER_NAME = "X-API-Key"
 api_key_header = APIKeyHeader(name=API_KEY_HEADER_NAME, auto_error=False)
 
+# 校验结果缓存：key 哈希 -> (key 记录, 过期时间)，不保存明文 key
+_VERIFY_CACHE_TTL = 60.0
+_VERIFY_CACHE_MAX_SIZE = 1024
+_verify_cache: Dict[str, Tuple[dict, float]] = {}
+# 无效 key 的短期负缓存：key 哈希 -> 过期时间，减轻暴力探测对数据库的压力。
+# 与正向缓存分开存放，避免大量随机 key 挤掉有效 key 的缓存
+_NEGATIVE_CACHE_TTL = 5.0
+_negative_cache: Dict[str, float] = {}
+_verify_cache_lock = threading.Lock()
+
+
+def _cache_key(api_key: str) -> str:
+    # 与库中存储的 key_hash 使用同一哈希，未命中时可直接按哈希查库
+    return key_store.hash_key(api_key)
+
+
+def _cache_put(cache: dict, key: str, value) -> None:
+    cache.pop(key, None)
+    while len(cache) >= _VERIFY_CACHE_MAX_SIZE:
+        # dict 保持插入顺序，淘汰最早写入的条目 (FIFO)
+        del cache[next(iter(cache))]
+    cache[key] = value
+
+
+def _verify_api_key_cached(api_key: str) -> Optional[dict]:
+    """
+    带 TTL 的 key 校验：命中缓存时跳过数据库查询。
+    有效 key 缓存 _VERIFY_CACHE_TTL 秒，无效 key 缓存 _NEGATIVE_CACHE_TTL 秒。
+    """
+    cache_key = _cache_key(api_key)
+    now = time.monotonic()
+    with _verify_cache_lock:
+        cached = _verify_cache.get(cache_key)
+        if cached and now < cached[1]:
+            return cached[0]
+        negative_expiry = _negative_cache.get(cache_key)
+        if negative_expiry is not None and now < negative_expiry:
+            return None
+
+    record = key_store.verify_key(api_key, key_hash=cache_key)
+    with _verify_cache_lock:
+        if record:
+            _negative_cache.pop(cache_key, None)
+            _cache_put(_verify_cache, cache_key, (record, now + _VERIFY_CACHE_TTL))
+        else:
+            _cache_put(_negative_cache, cache_key, now + _NEGATIVE_CACHE_TTL)
+    return record
+
+
+def invalidate_api_key_cache(api_key: Optional[str] = None) -> None:
+    """使指定 key（或全部 key）的校验缓存失效，在 key 被吊销或变更角色时调用"""
+    with _verify_cache_lock:
+        if api_key is None:
+            _verify_cache.clear()
+            _negative_cache.clear()
+        else:
+            cache_key = _cache_key(api_key)
+            _verify_cache.pop(cache_key, None)
+            _negative_cache.pop(cache_key, None)
+
 
 async def require_api_key(request: Request, api_key: str = Security(api_key_header)) -> dict:
     """
@@ -21,7 +85,7 @@ async def require_api_key(request: Request, api_key: str = Security(api_key_head
             headers={"WWW-Authenticate": "API key"},
         )
 
-    record = key_store.verify_key(api_key)
+    record = _verify_api_key_cached(api_key)
     if not record:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -19,10 +19,36 @@ class Settings:
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
     OLLAMA_BASE_URL: Optional[str] = os.getenv("OLLAMA_BASE_URL", None)
     
+    # 数据目录：API Key、聊天记录、向量缓存等 SQLite 文件及初始超级管理员 key 的默认存放位置
+    DATA_DIR: str = os.getenv("DATA_DIR", "./data")
+
     # RAG
     VECTOR_STORE_PATH: str = os.getenv("VECTOR_STORE_PATH", "./chroma_db")
     CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "1000"))
     CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "200"))
+    # 线程池大小（run_in_threadpool / asyncio 默认 executor），默认沿用 anyio 的 40
+    THREAD_POOL_SIZE: int = int(os.getenv("THREAD_POOL_SIZE", "40"))
+    # PDF 解析进程池的 worker 数，默认等于 CPU 核数
+    PARSE_POOL_WORKERS: Optional[int] = int(os.getenv("PARSE_POOL_WORKERS")) if os.getenv("PARSE_POOL_WORKERS") else None
+    # 上传大文件时每批写入向量库的 chunk 数
+    INGEST_BATCH_SIZE: int = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+    # 每次请求 Ollama 计算向量的文本数
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    # 向量缓存（按模型 + 文本内容寻址）的 SQLite 路径，留空则关闭
+    EMBED_CACHE_PATH: str = os.getenv("EMBED_CACHE_PATH", os.path.join(DATA_DIR, "embed_cache.db"))
+    # HNSW 索引参数：距离度量（l2 / cosine / ip）、每个节点的邻居数、建索引与检索时的候选队列大小。
+    # 默认与 Chroma 一致，调低 ef 换取速度，调高换取召回。
+    # 只在首次创建集合（或 reset 重建）时写入；已存在的集合沿用创建时的配置，修改这里会被静默忽略
+    HNSW_SPACE: str = os.getenv("HNSW_SPACE", "l2")
+    HNSW_M: int = int(os.getenv("HNSW_M", "16"))
+    HNSW_EF_CONSTRUCTION: int = int(os.getenv("HNSW_EF_CONSTRUCTION", "100"))
+    HNSW_EF_SEARCH: int = int(os.getenv("HNSW_EF_SEARCH", "100"))
+    # 启动时预热向量库（创建 RAGService 并执行一次检索），需要 Ollama 可用
+    RAG_WARMUP: bool = os.getenv("RAG_WARMUP", "false").lower() in ("1", "true", "yes")
+    # 检索语义缓存：条目数（0 表示关闭）、命中的余弦相似度阈值、过期时间（秒）
+    SEMANTIC_CACHE_SIZE: int = int(os.getenv("SEMANTIC_CACHE_SIZE", "256"))
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    SEMANTIC_CACHE_TTL: float = float(os.getenv("SEMANTIC_CACHE_TTL", "300"))
     
     # Prompt
     SYSTEM_PROMPT: str = os.getenv("SYSTEM_PROMPT", "用中文回复。")
@@ -1,6 +1,33 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import anyio.to_thread
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 
 from app.api import router as api_router
+from app.api.deps import close_llm
+from app.api.routes.chat import drain_background_tasks
+from app.core.config import settings
+from app.services.key_store import bootstrap_super_admin
+from app.services.rag import warmup_rag_service
+from app.utils.file_parsers import shutdown_parse_pool
+
+
+async def configure_thread_pool() -> None:
+    """
+    按 THREAD_POOL_SIZE 设置线程池容量：
+    anyio 的线程数上限决定 run_in_threadpool 的并发数，asyncio 默认 executor 用于 run_in_executor(None, ...)
+    """
+    size = settings.THREAD_POOL_SIZE
+    anyio.to_thread.current_default_thread_limiter().total_tokens = size
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=size))
+
+
+async def warmup() -> None:
+    """启动时在线程池中预热向量库"""
+    await run_in_threadpool(warmup_rag_service)
 
 
 def create_app() -> FastAPI:
@@ -10,11 +37,26 @@ def create_app() -> FastAPI:
     app = FastAPI(
         title="Ace AI",
         version="0.1.0",
+        # 使用 orjson 序列化响应：中文不再被转义为 \uXXXX，编码更快、体积更小
+        default_response_class=ORJSONResponse,
         # 权限控制已在 api router 中按路由分别配置
     )
     
     # 注册 API Router（各路由自行管理权限）
     app.include_router(api_router)
+
+    app.add_event_handler("startup", configure_thread_pool)
+    # 首次启动时生成 super_admin key（不在导入时执行，避免导入副作用）
+    app.add_event_handler("startup", bootstrap_super_admin)
+
+    # 按需在启动时预热向量库
+    if settings.RAG_WARMUP:
+        app.add_event_handler("startup", warmup)
+
+    # 关闭时等待未完成的聊天记录写入，并释放 PDF 解析进程池和 LLM 连接池
+    app.add_event_handler("shutdown", drain_background_tasks)
+    app.add_event_handler("shutdown", shutdown_parse_pool)
+    app.add_event_handler("shutdown", close_llm)
     
     return app
 
@@ -1,5 +1,5 @@
-from typing import Generic, TypeVar, Optional, List, get_args
-from pydantic import BaseModel, field_validator
+from typing import Generic, TypeVar, Optional, List
+from pydantic import BaseModel
 from app.services.key_store import Role
 
 T = TypeVar("T")
@@ -41,18 +41,10 @@ class DocumentListResponse(BaseModel):
     documents: List[DocumentResponse]
 
 class APIKeyCreateRequest(BaseModel):
+    # Role 为 Literal，Pydantic 已在校验时限定取值，无需额外的 validator
     role: Role
     label: str | None = None
 
-    @field_validator('role')
-    @classmethod
-    def validate_role(cls, v: str) -> Role:
-        """验证并转换 role 为正确的 Literal 类型"""
-        allowed_roles = get_args(Role)
-        if v not in allowed_roles:
-            raise ValueError(f"role must be one of {allowed_roles}")
-        return v  # type: ignore
-
 class APIKeyCreateResponse(BaseModel):
     api_key: str
     role: Role
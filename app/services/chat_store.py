@@ -1,21 +1,36 @@
+import os
 import sqlite3
 import threading
 import uuid
+from collections import deque
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.utils.sqlite import configure_connection, connect_readonly
 
 class ChatStore:
     def __init__(self, db_path: str = "./data/chat.db"):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # 写操作共用一个连接并由 RLock 串行化；读操作使用各线程自己的只读连接
         self._lock = threading.RLock()
+        self._local = threading.local()
         self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self._conn.row_factory = sqlite3.Row
+        configure_connection(self._conn)
         # 启用外键约束，确保 ON DELETE CASCADE 生效
         self._conn.execute("PRAGMA foreign_keys = ON")
         self._setup()
 
+    def _read_conn(self) -> sqlite3.Connection:
+        """当前线程专用的只读连接（惰性创建），读操作无需争用写锁"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect_readonly(self.db_path)
+        return conn
+
     def _setup(self) -> None:
         with self._conn:
             self._conn.execute(
@@ -41,6 +56,13 @@ class ChatStore:
                 )
                 """
             )
+            # 覆盖 list_sessions / get_messages 的过滤与排序，避免全表扫描 + 排序
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sessions_key_updated ON chat_sessions(api_key_id, updated_at DESC)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_msgs_session_created ON chat_messages(session_id, created_at)"
+            )
 
     def create_session(self, api_key_id: int, name: Optional[str] = None) -> Dict:
         with self._lock:
@@ -63,21 +85,19 @@ class ChatStore:
             }
 
     def get_session(self, session_id: str, api_key_id: int) -> Optional[Dict]:
-        with self._lock:
-            cursor = self._conn.execute(
-                "SELECT * FROM chat_sessions WHERE id = ? AND api_key_id = ?",
-                (session_id, api_key_id)
-            )
-            row = cursor.fetchone()
-            return dict(row) if row else None
+        cursor = self._read_conn().execute(
+            "SELECT * FROM chat_sessions WHERE id = ? AND api_key_id = ?",
+            (session_id, api_key_id)
+        )
+        row = cursor.fetchone()
+        return dict(row) if row else None
 
     def list_sessions(self, api_key_id: int) -> List[Dict]:
-        with self._lock:
-            cursor = self._conn.execute(
-                "SELECT * FROM chat_sessions WHERE api_key_id = ? ORDER BY updated_at DESC",
-                (api_key_id,)
-            )
-            return [dict(row) for row in cursor.fetchall()]
+        cursor = self._read_conn().execute(
+            "SELECT id, name, created_at, updated_at FROM chat_sessions WHERE api_key_id = ? ORDER BY updated_at DESC",
+            (api_key_id,)
+        )
+        return [dict(row) for row in cursor.fetchall()]
 
     def delete_session(self, session_id: str, api_key_id: int) -> bool:
         with self._lock:
@@ -111,12 +131,54 @@ class ChatStore:
                 "created_at": now
             }
 
-    def get_messages(self, session_id: str) -> List[Dict]:
+    def add_messages_bulk(
+        self, session_id: str, items: List[Tuple[str, str, Optional[str]]]
+    ) -> List[Dict]:
+        """
+        在一个事务中批量写入多条消息，只更新一次会话的 updated_at。
+
+        items 为 (role, content, created_at) 列表；created_at 为 None 时使用写入时刻，
+        调用方可传入消息实际产生的时间（如用户发送时间）。
+        """
+        if not items:
+            return []
         with self._lock:
-            cursor = self._conn.execute(
-                "SELECT * FROM chat_messages WHERE session_id = ? ORDER BY created_at ASC",
-                (session_id,)
-            )
-            return [dict(row) for row in cursor.fetchall()]
+            now = datetime.now(timezone.utc).isoformat()
+            rows = [
+                (session_id, role, content, created_at or now)
+                for role, content, created_at in items
+            ]
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO chat_messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.execute(
+                    "UPDATE chat_sessions SET updated_at = ? WHERE id = ?",
+                    (now, session_id)
+                )
+                # executemany 不更新 cursor.lastrowid；AUTOINCREMENT 在事务内连续递增，由最后一个 id 反推
+                last_id = self._conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+            first_id = last_id - len(rows) + 1
+            return [
+                {
+                    "id": first_id + i,
+                    "session_id": session_id,
+                    "role": role,
+                    "content": content,
+                    "created_at": created_at
+                }
+                for i, (_, role, content, created_at) in enumerate(rows)
+            ]
+
+    def get_messages(self, session_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """获取会话消息（按时间升序）；指定 limit 时只返回最近的 limit 条"""
+        cursor = self._read_conn().execute(
+            "SELECT id, role, content, created_at FROM chat_messages WHERE session_id = ? ORDER BY created_at ASC, id ASC",
+            (session_id,)
+        )
+        rows = deque(cursor, maxlen=limit) if limit else cursor.fetchall()
+        return [dict(row) for row in rows]
 
-chat_store = ChatStore()
+chat_store = ChatStore(os.path.join(settings.DATA_DIR, "chat.db"))
@@ -0,0 +1,70 @@
+"""按内容寻址的向量缓存：相同模型 + 相同文本只调用一次 Embedding 模型，使用 SQLite 持久化。"""
+
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from blake3 import blake3
+
+from app.utils.sqlite import configure_connection, connect_readonly
+
+# 单条 SQL 中 IN (...) 的参数个数上限，远低于 SQLite 的变量数限制
+_LOOKUP_BATCH_SIZE = 500
+
+
+class EmbeddingCache:
+    def __init__(self, db_path: str, model: str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # 模型名参与哈希，切换模型后不会命中旧向量
+        self._key_prefix = model.encode("utf-8") + b"\0"
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        configure_connection(self._conn)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embed_cache (key BLOB PRIMARY KEY, vector BLOB NOT NULL) WITHOUT ROWID"
+            )
+
+    def _read_conn(self) -> sqlite3.Connection:
+        """当前线程专用的只读连接（惰性创建）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect_readonly(self.db_path)
+        return conn
+
+    def _key(self, text: str) -> bytes:
+        return blake3(self._key_prefix + text.encode("utf-8")).digest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """按顺序返回每个文本的缓存向量，未命中的位置为 None"""
+        keys = [self._key(text) for text in texts]
+        found: Dict[bytes, bytes] = {}
+        conn = self._read_conn()
+        for start in range(0, len(keys), _LOOKUP_BATCH_SIZE):
+            batch = keys[start:start + _LOOKUP_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            found.update(
+                conn.execute(
+                    f"SELECT key, vector FROM embed_cache WHERE key IN ({placeholders})", batch
+                ).fetchall()
+            )
+        return [
+            np.frombuffer(found[key], dtype=np.float32).tolist() if key in found else None
+            for key in keys
+        ]
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]) -> None:
+        """写入新计算的向量（以 float32 存储），已存在的 key 保持不变"""
+        rows = [
+            (self._key(text), np.asarray(vector, dtype=np.float32).tobytes())
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO embed_cache (key, vector) VALUES (?, ?)", rows
+                )
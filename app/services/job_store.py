@@ -0,0 +1,45 @@
+"""后台上传任务的状态存储（进程内内存）"""
+
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+
+class UploadJobStore:
+    def __init__(self, max_jobs: int = 1000):
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._max_jobs = max_jobs
+
+    def create_job(self, filename: str) -> Dict[str, Any]:
+        """创建排队中的任务，超出容量时淘汰最早的任务"""
+        now = datetime.now(timezone.utc).isoformat()
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "status": "queued",
+            "filename": filename,
+            "created_at": now,
+            "updated_at": now,
+        }
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+            while len(self._jobs) > self._max_jobs:
+                self._jobs.popitem(last=False)
+        return dict(job)
+
+    def update_job(self, job_id: str, **fields: Any) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields, updated_at=datetime.now(timezone.utc).isoformat())
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+
+job_store = UploadJobStore()
@@ -1,12 +1,23 @@
 """简单的 API Key 存储与校验服务，使用 SQLite 持久化。"""
 
 import hashlib
+import os
 import sqlite3
 import threading
 import uuid
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional, Dict, Literal, TypedDict
+from typing import Optional, Dict, List, Literal, TypedDict
+
+from blake3 import blake3
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows 无 fcntl，仅依赖进程内的锁
+    fcntl = None
+
+from app.core.config import settings
+from app.utils.sqlite import configure_connection, connect_readonly
 
 
 Role = Literal["user", "admin", "super_admin"]
@@ -25,10 +36,20 @@ class APIKeyStore:
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         # 使用 RLock 以允许嵌套调用（get_or_create_super_admin -> create_key）
         self._lock = threading.RLock()
+        # 读操作使用各线程自己的只读连接，不与写操作争用锁
+        self._local = threading.local()
         self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self._conn.row_factory = sqlite3.Row
+        configure_connection(self._conn)
         self._setup()
 
+    def _read_conn(self) -> sqlite3.Connection:
+        """当前线程专用的只读连接（惰性创建），读操作无需争用写锁"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect_readonly(self.db_path)
+        return conn
+
     def _setup(self) -> None:
         with self._conn:
             self._conn.execute(
@@ -42,44 +63,82 @@ class APIKeyStore:
                 )
                 """
             )
+            # get_or_create_super_admin 按 role 查找
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_keys_role ON api_keys(role)")
+
+    @staticmethod
+    def hash_key(raw_key: str) -> str:
+        """计算 key 在库中存储的哈希，也用作校验缓存的键"""
+        # 带版本前缀，便于与旧的 sha256 哈希（无前缀）区分
+        return "b3:" + blake3(raw_key.encode("utf-8")).hexdigest()
 
     @staticmethod
-    def _hash_key(raw_key: str) -> str:
+    def _legacy_hash_key(raw_key: str) -> str:
         return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
 
     def create_key(self, role: Role, label: Optional[str] = None) -> APIKeyCreateResult:
         """
         生成随机 API Key，存储哈希，返回明文 key 及基础信息。
         """
+        return self.create_keys(role, 1, label)[0]
+
+    def create_keys(self, role: Role, count: int, label: Optional[str] = None) -> List[APIKeyCreateResult]:
+        """
+        批量生成 count 个相同角色的 API Key，在一个事务中用 executemany 写入。
+        """
+        raw_keys = [uuid.uuid4().hex for _ in range(count)]
+        created_at = datetime.now(timezone.utc).isoformat()
+        rows = [(self.hash_key(raw_key), role, label, created_at) for raw_key in raw_keys]
         with self._lock:
-            raw_key = uuid.uuid4().hex
-            key_hash = self._hash_key(raw_key)
-            created_at = datetime.now(timezone.utc).isoformat()
             with self._conn:
-                self._conn.execute(
+                self._conn.executemany(
                     "INSERT INTO api_keys (key_hash, role, label, created_at) VALUES (?, ?, ?, ?)",
-                    (key_hash, role, label, created_at),
+                    rows,
                 )
-        return {"api_key": raw_key, "role": role, "label": label or "", "created_at": created_at}
+        return [
+            {"api_key": raw_key, "role": role, "label": label or "", "created_at": created_at}
+            for raw_key in raw_keys
+        ]
 
-    def verify_key(self, raw_key: str) -> Optional[Dict[str, str]]:
+    def verify_key(self, raw_key: str, key_hash: Optional[str] = None) -> Optional[Dict[str, str]]:
         """
         校验明文 key，返回记录（不含明文）。
+
+        key_hash 为调用方已计算好的 hash_key(raw_key)，可省去重复哈希。
+        切换到 BLAKE3 之前创建的 key 按旧的 sha256 哈希命中后，会就地改写为新哈希。
         """
-        key_hash = self._hash_key(raw_key)
-        with self._lock:
-            cursor = self._conn.execute(
-                "SELECT id, role, label, created_at FROM api_keys WHERE key_hash = ?", (key_hash,)
-            )
-            row = cursor.fetchone()
-            if row:
-                return dict(row)
+        key_hash = key_hash or self.hash_key(raw_key)
+        record = self.verify_key_hash(key_hash)
+        if record is not None:
+            return record
+
+        # 先在只读连接上确认旧哈希存在，无效 key 不会触发写锁和写事务
+        legacy_hash = self._legacy_hash_key(raw_key)
+        if self.verify_key_hash(legacy_hash) is None:
             return None
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE api_keys SET key_hash = ? WHERE key_hash = ?", (key_hash, legacy_hash)
+                )
+        # 并发请求可能已完成改写，按新哈希重新读取
+        return self.verify_key_hash(key_hash)
+
+    def verify_key_hash(self, key_hash: str) -> Optional[Dict[str, str]]:
+        """
+        按已计算好的 key 哈希精确查找记录（不处理旧的 sha256 哈希）。
+        """
+        cursor = self._read_conn().execute(
+            "SELECT id, role, label, created_at FROM api_keys WHERE key_hash = ?", (key_hash,)
+        )
+        row = cursor.fetchone()
+        if row:
+            return dict(row)
+        return None
 
     def has_any_key(self) -> bool:
-        with self._lock:
-            cursor = self._conn.execute("SELECT 1 FROM api_keys LIMIT 1")
-            return cursor.fetchone() is not None
+        cursor = self._read_conn().execute("SELECT 1 FROM api_keys LIMIT 1")
+        return cursor.fetchone() is not None
 
     def get_or_create_super_admin(self) -> Optional[str]:
         """
@@ -93,19 +152,43 @@ class APIKeyStore:
             return created["api_key"]
 
     def list_keys(self) -> Dict[str, list]:
-        with self._lock:
-            cursor = self._conn.execute(
-                "SELECT id, role, label, created_at FROM api_keys ORDER BY created_at DESC"
-            )
-            rows = [dict(row) for row in cursor.fetchall()]
-            return {"items": rows}
-
-
-# 创建全局实例，并在无 super_admin 时自动生成一个
-key_store = APIKeyStore()
-bootstrap_key = key_store.get_or_create_super_admin()
-if bootstrap_key:
-    bootstrap_path = Path("./data/initial_superadmin_key.txt")
-    # 仅在首次生成时写入文件，方便运维取用
-    bootstrap_path.write_text(bootstrap_key, encoding="utf-8")
-    print(f"[bootstrap] Super admin API key generated and stored at {bootstrap_path}")
+        cursor = self._read_conn().execute(
+            "SELECT id, role, label, created_at FROM api_keys ORDER BY created_at DESC"
+        )
+        rows = [dict(row) for row in cursor.fetchall()]
+        return {"items": rows}
+
+
+# 创建全局实例；super_admin 的初始化见 bootstrap_super_admin（应用启动时调用）
+key_store = APIKeyStore(os.path.join(settings.DATA_DIR, "api_keys.db"))
+
+BOOTSTRAP_KEY_PATH = Path(settings.DATA_DIR) / "initial_superadmin_key.txt"
+
+
+def bootstrap_super_admin(path: Path = BOOTSTRAP_KEY_PATH) -> None:
+    """
+    无 super_admin 时生成一个，并把明文 key 写入文件方便运维取用。
+
+    多 worker 同时启动时用文件锁串行化检查与创建。先以 O_EXCL 和 0600 权限写入同目录的
+    临时文件，再用 os.replace 原子替换目标文件：文件中总是当前有效的 key，
+    不会残留上一次（例如数据库被重置前）生成的旧 key，也不会出现写了一半的文件。
+    """
+    lock_path = key_store.db_path.with_name(key_store.db_path.name + ".bootstrap.lock")
+    with open(lock_path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        bootstrap_key = key_store.get_or_create_super_admin()
+        if not bootstrap_key:
+            return
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(bootstrap_key)
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        print(f"[bootstrap] Super admin API key generated and stored at {path}")
@@ -1,17 +1,25 @@
 import threading
-from functools import lru_cache
-from typing import List, Dict, Optional
+import uuid
+from typing import List, Dict, Optional, TypedDict
 from langchain_ollama import OllamaEmbeddings
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
 
 from app.core.config import settings
+from app.services.embed_cache import EmbeddingCache
+from app.services.semantic_cache import SemanticCache
 
 # --- 配置 ---
 EMBEDDING_MODEL = settings.EMBEDDING_MODEL
 VECTOR_STORE_PATH = settings.VECTOR_STORE_PATH
 
 
+class DocRow(TypedDict):
+    id: str
+    content: str
+    metadata: Dict
+
+
 class RAGService:
     def __init__(self):
         # 线程锁，保护向量存储操作
@@ -23,12 +31,101 @@ class RAGService:
             base_url=settings.OLLAMA_BASE_URL,
         )
 
+        # 文本向量的持久化缓存，重复导入相同内容时跳过 Embedding 调用
+        self.embed_cache = (
+            EmbeddingCache(settings.EMBED_CACHE_PATH, EMBEDDING_MODEL)
+            if settings.EMBED_CACHE_PATH
+            else None
+        )
+
+        # 检索结果的语义缓存，知识库任何变更都会使其失效
+        self.query_cache = SemanticCache(
+            max_size=settings.SEMANTIC_CACHE_SIZE,
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            ttl=settings.SEMANTIC_CACHE_TTL,
+        )
+
         # 初始化向量数据库 (Chroma)
-        # persist_directory 指定数据保存的本地路径
-        self.vector_store = Chroma(
-            persist_directory=VECTOR_STORE_PATH, embedding_function=self.embeddings
+        self.vector_store = self._create_vector_store()
+
+    def _create_vector_store(self) -> Chroma:
+        """
+        创建（或打开已有的）Chroma 集合
+
+        persist_directory 指定数据保存的本地路径；HNSW 参数只在集合首次创建时写入
+        """
+        return Chroma(
+            persist_directory=VECTOR_STORE_PATH,
+            embedding_function=self.embeddings,
+            collection_metadata={
+                "hnsw:space": settings.HNSW_SPACE,
+                "hnsw:M": settings.HNSW_M,
+                "hnsw:construction_ef": settings.HNSW_EF_CONSTRUCTION,
+                "hnsw:search_ef": settings.HNSW_EF_SEARCH,
+            },
         )
 
+    @property
+    def _collection(self):
+        """
+        底层的 chromadb Collection。读写热路径直接调用它，跳过 LangChain 包装层
+        （参数重组、Document 构造）；Chroma 包装器只用于创建/重置集合。
+        reset 后包装器会重建集合，因此每次都从包装器取最新的集合对象。
+        """
+        return self.vector_store._collection
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        批量计算文本向量（一次 Ollama 请求）
+
+        同一批中重复的文本只计算一次；先查向量缓存，只对未命中的文本请求 Ollama 并回写缓存。
+        不访问向量存储，因此无需加锁，可在多个线程中并发调用
+        """
+        unique_texts = list(dict.fromkeys(texts))
+        if len(unique_texts) == len(texts):
+            return self._embed_unique(texts)
+        vector_by_text = dict(zip(unique_texts, self._embed_unique(unique_texts)))
+        return [vector_by_text[text] for text in texts]
+
+    def _embed_unique(self, texts: List[str]) -> List[List[float]]:
+        """计算一批互不重复的文本向量（优先使用向量缓存）"""
+        if self.embed_cache is None:
+            return self.embeddings.embed_documents(texts)
+
+        vectors = self.embed_cache.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            computed = self.embeddings.embed_documents(missing_texts)
+            self.embed_cache.put_many(missing_texts, computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        return vectors
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[Dict]] = None,
+        ids: Optional[List[str]] = None,
+    ):
+        """
+        将已计算好向量的文本直接写入 Chroma 集合（单次批量写入）
+
+        Args:
+            texts: 文本内容列表
+            embeddings: 与 texts 一一对应的向量
+            metadatas: 元数据列表（可选）
+            ids: 文档 ID 列表（可选），缺省时自动生成
+        """
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in texts]
+        with self._lock:
+            self._collection.add(
+                ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas
+            )
+            self.query_cache.invalidate()
+
     def add_documents(
         self,
         texts: List[str],
@@ -43,12 +140,11 @@ class RAGService:
             metadatas: 元数据列表（可选），每个文本对应一个字典
             ids: 文档 ID 列表（可选），用于追踪和删除
         """
-        documents = [
-            Document(page_content=text, metadata=metadatas[i] if metadatas else {})
-            for i, text in enumerate(texts)
-        ]
-        with self._lock:
-            self.vector_store.add_documents(documents, ids=ids)
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+        embeddings: List[List[float]] = []
+        for start in range(0, len(texts), batch_size):
+            embeddings.extend(self.embed_documents(texts[start:start + batch_size]))
+        self.add_embeddings(texts, embeddings, metadatas=metadatas, ids=ids)
         # Chroma 现在的版本通常会自动持久化
 
     def reset(self):
@@ -56,20 +152,49 @@ class RAGService:
         清空向量数据库
         """
         with self._lock:
-            # 删除集合
-            self.vector_store.delete_collection()
-            # 重新初始化
-            self.vector_store = Chroma(
-                persist_directory=VECTOR_STORE_PATH, embedding_function=self.embeddings
-            )
+            # 在现有客户端上删除并重建集合（沿用原有 HNSW 参数），无需重新创建 Chroma 客户端
+            self.vector_store.reset_collection()
+            self.query_cache.invalidate()
 
     def query(self, query_text: str, k: int = 3) -> List[Document]:
         """
-        根据问题检索最相关的 k 个文档片段
+        根据问题检索最相关的 k 个文档片段（包含 metadata）
         """
+        vector = self.embeddings.embed_query(query_text)
         with self._lock:
-            # similarity_search 会返回最相似的文档
-            return self.vector_store.similarity_search(query_text, k=k)
+            result = self._collection.query(
+                query_embeddings=[vector], n_results=k, include=["documents", "metadatas"]
+            )
+        if not result["ids"]:
+            return []
+        # 只在返回给调用方时构造 Document
+        return [
+            Document(id=doc_id, page_content=content, metadata=metadata or {})
+            for doc_id, content, metadata in zip(
+                result["ids"][0], result["documents"][0], result["metadatas"][0]
+            )
+        ]
+
+    def query_texts(self, query_text: str, k: int = 3) -> List[str]:
+        """
+        根据问题检索最相关的 k 个文档片段，仅返回文本内容
+
+        直接调用 Chroma 集合的 query 且只取 documents，不构造 Document 对象；
+        相似问题（向量余弦相似度超过阈值）直接返回语义缓存中的结果，跳过向量检索
+        """
+        vector = self.embeddings.embed_query(query_text)
+        generation = self.query_cache.generation
+        cached = self.query_cache.get(vector, k)
+        if cached is not None:
+            return cached
+        with self._lock:
+            # 复用已计算的查询向量，只返回文本
+            result = self._collection.query(
+                query_embeddings=[vector], n_results=k, include=["documents"]
+            )
+        texts = result["documents"][0] if result["documents"] else []
+        self.query_cache.put(vector, k, texts, generation)
+        return texts
 
     def get_all_documents(
         self, limit: Optional[int] = None, offset: Optional[int] = None
@@ -81,7 +206,7 @@ class RAGService:
         try:
             with self._lock:
                 # 显式指定 include，避免获取 embeddings (数据量大)
-                return self.vector_store.get(
+                return self._collection.get(
                     include=["metadatas", "documents"], limit=limit, offset=offset
                 )
         except Exception as e:
@@ -94,7 +219,7 @@ class RAGService:
         """
         try:
             with self._lock:
-                return self.vector_store._collection.count()
+                return self._collection.count()
         except Exception as e:
             print(f"获取文档总数失败: {e}")
             return 0
@@ -105,23 +230,30 @@ class RAGService:
         """
         try:
             with self._lock:
-                self.vector_store.delete(ids=[doc_id])
+                self._collection.delete(ids=[doc_id])
+                self.query_cache.invalidate()
             return True
         except Exception as e:
             print(f"删除文档失败: {e}")
             return False
 
-    def delete_documents_by_filter(self, filter_dict: Dict) -> bool:
+    def delete_documents_by_filter(self, filter_dict: Dict) -> Optional[int]:
         """
         根据 metadata 过滤条件批量删除文档
+
+        返回删除的文档数量；失败时返回 None
         """
         try:
             with self._lock:
-                self.vector_store.delete(where=filter_dict)
-            return True
+                # 只取 ID（不取 documents/metadatas），再按 ID 删除，一次加锁内完成计数与删除
+                ids = self._collection.get(where=filter_dict, include=[])["ids"]
+                if ids:
+                    self._collection.delete(ids=ids)
+                    self.query_cache.invalidate()
+            return len(ids)
         except Exception as e:
             print(f"批量删除失败: {e}")
-            return False
+            return None
 
     def get_documents_by_filter(self, filter_dict: Dict) -> Dict:
         """
@@ -129,22 +261,22 @@ class RAGService:
         """
         try:
             with self._lock:
-                return self.vector_store.get(where=filter_dict, include=["metadatas"])
+                return self._collection.get(where=filter_dict, include=["metadatas"])
         except Exception as e:
             return {"ids": [], "documents": [], "metadatas": []}
 
-    def get_document(self, doc_id: str) -> Optional[Dict]:
+    def get_document(self, doc_id: str) -> Optional[DocRow]:
         """
         获取单个文档的详细信息
         """
         try:
             with self._lock:
-                result = self.vector_store.get(ids=[doc_id])
+                result = self._collection.get(ids=[doc_id], include=["documents", "metadatas"])
                 if result["ids"]:
                     return {
                         "id": result["ids"][0],
                         "content": result["documents"][0],
-                        "metadata": result["metadatas"][0] if result["metadatas"] else {},
+                        "metadata": (result["metadatas"][0] if result["metadatas"] else None) or {},
                     }
                 return None
         except Exception as e:
@@ -152,9 +284,31 @@ class RAGService:
             return None
 
 
-@lru_cache
+_rag_service: Optional[RAGService] = None
+_rag_service_lock = threading.Lock()
+
+
 def get_rag_service() -> RAGService:
     """
     延迟创建 RAGService，避免应用启动时阻塞（例如等待 Ollama 模型加载）。
+
+    双重检查加锁：已创建后只读一次模块变量；并发的首次调用（如启动预热与首个请求）
+    也只会创建一个实例，lru_cache 不保证这一点。
+    """
+    global _rag_service
+    if _rag_service is None:
+        with _rag_service_lock:
+            if _rag_service is None:
+                _rag_service = RAGService()
+    return _rag_service
+
+
+def warmup_rag_service() -> None:
+    """
+    预热 RAGService：提前完成初始化并执行一次检索，将 HNSW 索引载入内存，
+    避免首个用户请求承担冷启动开销。失败时仅记录，不影响应用启动。
     """
-    return RAGService()
+    try:
+        get_rag_service().query_texts("warmup", k=1)
+    except Exception as e:
+        print(f"RAG 预热失败: {e}")
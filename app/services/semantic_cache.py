@@ -0,0 +1,93 @@
+"""检索结果的语义缓存：相似问题（向量余弦相似度超过阈值）直接复用已检索的文档"""
+
+import threading
+import time
+from typing import Any, List, Optional
+
+import numpy as np
+
+
+class SemanticCache:
+    def __init__(self, max_size: int = 256, threshold: float = 0.95, ttl: float = 300.0):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        # 已归一化的查询向量矩阵 (N x d)，与 _entries 按行对应
+        self._vectors: Optional[np.ndarray] = None
+        # 每行对应 [k, 检索结果, 过期时间, 最近使用时间]
+        self._entries: List[list] = []
+        # 知识库每次变更都会递增，旧代的写入会被丢弃
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> Optional[np.ndarray]:
+        q = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        return q / norm if norm else None
+
+    def _drop(self, idx: int) -> None:
+        self._vectors = np.delete(self._vectors, idx, axis=0)
+        del self._entries[idx]
+
+    def get(self, vector: List[float], k: int) -> Optional[Any]:
+        """查找与 vector 足够相似且未过期的缓存结果"""
+        if self.max_size <= 0:
+            return None
+        q = self._normalize(vector)
+        if q is None:
+            return None
+        with self._lock:
+            if not self._entries:
+                return None
+            now = time.monotonic()
+            expired = [i for i, entry in enumerate(self._entries) if now >= entry[2]]
+            if expired:
+                # 先整体清除过期条目，避免其占据最相似的位置而遮住仍然有效的条目
+                self._vectors = np.delete(self._vectors, expired, axis=0)
+                expired_set = set(expired)
+                self._entries = [e for i, e in enumerate(self._entries) if i not in expired_set]
+                if not self._entries:
+                    self._vectors, self._entries = None, []
+                    return None
+            sims = self._vectors @ q
+            # 只在 k 相同的条目中比较相似度
+            sims[[entry[0] != k for entry in self._entries]] = -np.inf
+            idx = int(np.argmax(sims))
+            if sims[idx] < self.threshold:
+                return None
+            entry = self._entries[idx]
+            entry[3] = now
+            return entry[1]
+
+    def put(self, vector: List[float], k: int, result: Any, generation: int) -> None:
+        """写入缓存；generation 与当前不一致（期间知识库有变更）时丢弃"""
+        if self.max_size <= 0:
+            return
+        q = self._normalize(vector)
+        if q is None:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            if self._vectors is not None and self._vectors.shape[1] != q.shape[0]:
+                # 向量维度变化（例如切换了 Embedding 模型），旧缓存不可用
+                self._vectors, self._entries = None, []
+            if len(self._entries) >= self.max_size:
+                # 淘汰最久未使用的条目
+                self._drop(min(range(len(self._entries)), key=lambda i: self._entries[i][3]))
+            now = time.monotonic()
+            row = q[np.newaxis, :]
+            self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+            self._entries.append([k, result, now + self.ttl, now])
+
+    def invalidate(self) -> None:
+        """知识库变更时清空缓存"""
+        with self._lock:
+            self._generation += 1
+            self._vectors = None
+            self._entries = []
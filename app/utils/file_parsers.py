@@ -1,21 +1,127 @@
 import io
-from pypdf import PdfReader
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from charset_normalizer import from_bytes
+
+from app.core.config import settings
+
+try:
+    # PyMuPDF 基于 MuPDF (C 实现)，提取速度远快于纯 Python 的 pypdf
+    import fitz
+except ImportError:  # pragma: no cover - 未安装 PyMuPDF 时回退到 pypdf
+    fitz = None
+    from pypdf import PdfReader
+
+
+# 并行解析时每个任务处理的页数
+PDF_PAGES_PER_TASK = 16
+
+
+def _init_parse_worker() -> None:
+    """进程池 worker 初始化：启动时预加载 PyMuPDF，避免首个任务冷启动"""
+    try:
+        import fitz  # noqa: F401
+    except ImportError:  # pragma: no cover - 回退到 pypdf 时无需预加载
+        pass
+
+
+@lru_cache
+def get_parse_pool() -> ProcessPoolExecutor:
+    """获取 PDF 解析进程池（单例模式，首次使用时创建），绕开 GIL 并行解析"""
+    # 不使用 fork：服务进程已启动事件循环与线程池，fork 出的子进程可能继承被持有的锁而死锁。
+    # forkserver 仅在 Unix 可用，其他平台回退到 spawn
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(
+        max_workers=settings.PARSE_POOL_WORKERS or os.cpu_count(),
+        mp_context=multiprocessing.get_context(method),
+        initializer=_init_parse_worker,
+    )
+
+
+def shutdown_parse_pool() -> None:
+    """关闭 PDF 解析进程池（仅在已创建时）"""
+    if get_parse_pool.cache_info().currsize:
+        get_parse_pool().shutdown(wait=False, cancel_futures=True)
+        get_parse_pool.cache_clear()
 
 def parse_txt(content: bytes) -> str:
-    """解析 TXT 文件"""
+    """解析 TXT 文件（自动识别编码，支持 UTF-8 / GB18030 / Big5 / Shift-JIS 等）"""
+    # 快速路径：纯 ASCII 或合法 UTF-8（绝大多数文件）无需编码探测
+    if content.isascii():
+        return content.decode('ascii')
     try:
         return content.decode('utf-8')
     except UnicodeDecodeError:
-        # 尝试其他编码
-        return content.decode('gbk', errors='ignore')
+        pass
+    result = from_bytes(content).best()
+    return str(result) if result is not None else content.decode('utf-8', errors='replace')
+
+def _has_no_text(page) -> bool:
+    """
+    判断 PyMuPDF 页面是否没有可提取的文本（如扫描图片页、空白页）。
+    内容流中没有文本对象 (BT) 且未引用 Form XObject 时，页面不含可提取文本；
+    读取内容流远比完整的文本提取便宜。
+    """
+    return not page.get_xobjects() and b"BT" not in page.read_contents()
+
+def _extract_fitz_pages(doc, start: int, stop: int) -> Tuple[List[str], List[int]]:
+    """提取 [start, stop) 页文本，跳过没有文本的页面，返回 (各页文本, 跳过的页码)"""
+    parts: List[str] = []
+    skipped: List[int] = []
+    for i in range(start, stop):
+        page = doc.load_page(i)
+        if _has_no_text(page):
+            skipped.append(i + 1)
+            continue
+        parts.append(page.get_text("text"))
+    return parts, skipped
 
 def parse_pdf(content: bytes) -> str:
     """解析 PDF 文件"""
-    pdf_file = io.BytesIO(content)
-    reader = PdfReader(pdf_file)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() + "\n"
+    if fitz is not None:
+        with fitz.open(stream=content, filetype="pdf") as doc:
+            parts, _ = _extract_fitz_pages(doc, 0, doc.page_count)
+    else:
+        reader = PdfReader(io.BytesIO(content))
+        parts = [page.extract_text() or "" for page in reader.pages]
+    # 使用 join 拼接，避免 += 导致的 O(n²) 字符串增长
+    return "\n".join(parts)
+
+def get_pdf_page_count(path: str) -> int:
+    """获取 PDF 页数"""
+    if fitz is not None:
+        with fitz.open(path) as doc:
+            return doc.page_count
+    return len(PdfReader(path).pages)
+
+def parse_pdf_pages(path: str, start: int = 0, stop: Optional[int] = None) -> Tuple[str, List[int]]:
+    """
+    从磁盘路径解析 PDF 的 [start, stop) 页（PyMuPDF 按需读取，无需整体载入内存）
+
+    返回 (文本, 跳过的无文本页码列表，从 1 开始)
+    """
+    if fitz is not None:
+        with fitz.open(path) as doc:
+            stop = doc.page_count if stop is None else min(stop, doc.page_count)
+            parts, skipped = _extract_fitz_pages(doc, start, stop)
+    else:
+        reader = PdfReader(path)
+        parts, skipped = [], []
+        for i, page in enumerate(reader.pages[start:stop], start=start + 1):
+            page_text = page.extract_text() or ""
+            if page_text:
+                parts.append(page_text)
+            else:
+                skipped.append(i)
+    return "\n".join(parts), skipped
+
+def parse_pdf_path(path: str) -> str:
+    """从磁盘路径解析整个 PDF 文件"""
+    text, _ = parse_pdf_pages(path)
     return text
 
 def parse_markdown(content: bytes) -> str:
@@ -30,3 +136,10 @@ def parse_file_content(content: bytes, file_ext: str) -> str:
         return parse_markdown(content)
     else:  # 默认为 txt
         return parse_txt(content)
+
+def parse_file_path(path: str, file_ext: str) -> str:
+    """根据文件扩展名解析磁盘上的文件"""
+    if file_ext == '.pdf':
+        return parse_pdf_path(path)
+    with open(path, 'rb') as f:
+        return parse_file_content(f.read(), file_ext)
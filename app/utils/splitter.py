@@ -0,0 +1,14 @@
+"""全局共享的文本分割器"""
+
+from semantic_text_splitter import TextSplitter
+
+from app.core.config import settings
+
+
+# 进程内唯一实例，各路由共用
+# semantic-text-splitter 由 Rust 实现，按 Unicode 语义边界（段落、句子、词）递归切分，
+# 可覆盖原先中英文标点分隔符的语义，且速度远快于纯 Python 的分割器
+text_splitter = TextSplitter(
+    capacity=settings.CHUNK_SIZE,
+    overlap=settings.CHUNK_OVERLAP,
+)
@@ -0,0 +1,35 @@
+"""SQLite 连接配置"""
+
+import sqlite3
+from pathlib import Path
+
+# WAL 模式下读写互不阻塞；synchronous=NORMAL 在 WAL 下只在 checkpoint 时 fsync，
+# 断电最多丢失最近提交的事务，但不会损坏数据库。
+# 注意：WAL 会在数据库文件旁生成 -wal / -shm 文件，备份与迁移时需一并处理。
+_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+def configure_connection(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """为连接启用 WAL 及相关性能参数，返回同一个连接"""
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def connect_readonly(db_path: Path) -> sqlite3.Connection:
+    """
+    以只读模式打开数据库（mode=ro URI），供单个线程独占使用。
+    WAL 模式下只读连接不会被写连接阻塞。
+    """
+    conn = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA busy_timeout = 5000")
+    conn.execute("PRAGMA mmap_size = 268435456")
+    return conn
@@ -1,10 +1,32 @@
-import pytest
-from fastapi.testclient import TestClient
+import os
+import shutil
+import tempfile
 
-from app.api.routes import chat, documents
-from app.api.deps import get_llm
-from app.main import app
-from app.services.key_store import key_store
+# 必须在导入 app 之前执行：配置在导入时读取环境变量，模块级的存储实例也在导入时打开数据库。
+# 每个 xdist worker（未启用 xdist 时为 master）使用独立的临时数据目录，不读写开发者本地 ./data 中的数据
+_WORKER_ID = os.environ.get("PYTEST_XDIST_WORKER", "master")
+_TEST_DATA_DIR = tempfile.mkdtemp(prefix=f"ace-ai-tests-{_WORKER_ID}-")
+os.environ["DATA_DIR"] = _TEST_DATA_DIR
+os.environ["EMBED_CACHE_PATH"] = os.path.join(_TEST_DATA_DIR, "embed_cache.db")
+os.environ["VECTOR_STORE_PATH"] = os.path.join(_TEST_DATA_DIR, "chroma_db")
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.api.routes import chat, documents  # noqa: E402
+from app.api.deps import get_llm  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services.chat_store import chat_store  # noqa: E402
+from app.services.key_store import key_store  # noqa: E402
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: 端到端冒烟测试（经过流式聊天接口）")
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_TEST_DATA_DIR, ignore_errors=True)
 
 
 class FakeDocument:
@@ -15,10 +37,7 @@ class FakeDocument:
 
 class FakeStreamChunk:
     def __init__(self, content: str):
-        self._content = content
-
-    def model_dump(self) -> dict:
-        return {"content": self._content}
+        self.content = content
 
 
 class FakeLLM:
@@ -38,6 +57,12 @@ class FakeRAGService:
             metadata = metadatas[idx] if metadatas else {}
             self.docs[doc_id] = {"content": text, "metadata": metadata}
 
+    def embed_documents(self, texts):
+        return [[float(len(text))] for text in texts]
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        self.add_documents(texts, metadatas=metadatas, ids=ids)
+
     def reset(self):
         self.docs.clear()
 
@@ -48,6 +73,9 @@ class FakeRAGService:
         items = list(self.docs.items())[:k]
         return [FakeDocument(payload["content"], payload["metadata"]) for _, payload in items]
 
+    def query_texts(self, query_text: str, k: int = 3):
+        return [payload["content"] for payload in list(self.docs.values())[:k]]
+
     def get_all_documents(self, limit=None, offset=None):
         ids = list(self.docs.keys())
         start = offset or 0
@@ -66,11 +94,11 @@ class FakeRAGService:
     def delete_document(self, doc_id: str) -> bool:
         return self.docs.pop(doc_id, None) is not None
 
-    def delete_documents_by_filter(self, filter_dict: dict) -> bool:
+    def delete_documents_by_filter(self, filter_dict: dict) -> int:
         matches = [doc_id for doc_id, payload in self.docs.items() if self._match_filter(payload["metadata"], filter_dict)]
         for doc_id in matches:
             self.docs.pop(doc_id, None)
-        return True
+        return len(matches)
 
     def get_documents_by_filter(self, filter_dict: dict):
         matches = [doc_id for doc_id, payload in self.docs.items() if self._match_filter(payload["metadata"], filter_dict)]
@@ -94,42 +122,66 @@ def fake_rag_service():
 
 
 @pytest.fixture
-def client(fake_rag_service, monkeypatch):
-    # Patch get_rag_service in both chat and documents modules
-    monkeypatch.setattr(chat, "get_rag_service", lambda: fake_rag_service)
-    monkeypatch.setattr(documents, "get_rag_service", lambda: fake_rag_service)
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def async_client(client):
+    """
+    直接基于 ASGITransport 的异步客户端，可在测试中用 asyncio.gather 并发发出请求。
+    依赖 client 以复用其中的 LLM / RAGService 替换。
+    """
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as ac:
+        yield ac
+
+
+@pytest.fixture(scope="session")
+def app_client():
     app.dependency_overrides[get_llm] = lambda: FakeLLM()
 
-    test_client = TestClient(app)
-    yield test_client
+    # 整个测试会话（每个 xdist worker）共用一个客户端，应用启动/关闭事件只执行一次；
+    # 以上下文方式启动，保证同一事件循环贯穿所有测试，后台保存任务不会被提前取消
+    with TestClient(app) as test_client:
+        yield test_client
 
     app.dependency_overrides.clear()
 
 
 @pytest.fixture
+def client(app_client, fake_rag_service, monkeypatch):
+    # Patch get_rag_service in both chat and documents modules（每个测试使用全新的 FakeRAGService）
+    monkeypatch.setattr(chat, "get_rag_service", lambda: fake_rag_service)
+    monkeypatch.setattr(documents, "get_rag_service", lambda: fake_rag_service)
+    return app_client
+
+
+# 管理员 key 不携带按用户隔离的数据，整个测试会话（每个 xdist worker）只创建一次
+@pytest.fixture(scope="session")
 def admin_api_key():
     created = key_store.create_key("admin", label="pytest-admin")
     return created["api_key"]
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def super_admin_api_key():
     created = key_store.create_key("super_admin", label="pytest-super-admin")
     return created["api_key"]
 
 
+# 会话列表按 key 隔离，每个测试使用新的 user key，保证彼此看不到对方的会话
 @pytest.fixture
 def user_api_key():
     created = key_store.create_key("user", label="pytest-user")
     return created["api_key"]
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def admin_headers(admin_api_key):
     return {"X-API-Key": admin_api_key}
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def super_admin_headers(super_admin_api_key):
     return {"X-API-Key": super_admin_api_key}
 
@@ -137,3 +189,14 @@ def super_admin_headers(super_admin_api_key):
 @pytest.fixture
 def user_headers(user_api_key):
     return {"X-API-Key": user_api_key}
+
+
+@pytest.fixture
+def seeded_session(user_api_key):
+    """直接通过 chat_store 预先创建一个含一轮对话的会话（不经过流式聊天接口）"""
+    api_key_id = key_store.verify_key(user_api_key)["id"]
+    session = chat_store.create_session(api_key_id, name="Hello Session")
+    chat_store.add_messages_bulk(
+        session["id"], [("user", "Hello Session", None), ("assistant", "stream chunk", None)]
+    )
+    return session
@@ -35,6 +35,19 @@ def test_ingest_and_retrieve_documents(client, super_admin_headers):
     assert detail_resp.json()["data"]["content"] == "Test document content"
 
 
+def test_get_document_raw(client, admin_headers):
+    client.post("/api/ingest", json={"text": "纯文本内容"}, headers=admin_headers)
+    doc_id = client.get("/api/documents", headers=admin_headers).json()["data"]["documents"][0]["id"]
+
+    raw_resp = client.get(f"/api/documents/{doc_id}/raw", headers=admin_headers)
+    assert raw_resp.status_code == 200
+    assert raw_resp.headers["content-type"].startswith("text/plain")
+    assert raw_resp.text == "纯文本内容"
+
+    missing_resp = client.get("/api/documents/missing/raw", headers=admin_headers)
+    assert missing_resp.status_code == 404
+
+
 def test_delete_document(client, admin_headers):
     client.post("/api/ingest", json={"text": "Delete me"}, headers=admin_headers)
     doc_id = client.get("/api/documents", headers=admin_headers).json()["data"]["documents"][0]["id"]
@@ -55,9 +68,16 @@ def test_upload_and_delete_by_source(client, super_admin_headers, fake_rag_servi
         files={"file": (file_name, b"hello world from upload", "text/plain")},
         headers=super_admin_headers,
     )
-    assert upload_resp.status_code == 200
-    body = upload_resp.json()["data"]
-    assert body["filename"] == file_name
+    assert upload_resp.status_code == 202
+    job = upload_resp.json()["data"]
+    assert job["filename"] == file_name
+    assert job["status"] == "queued"
+
+    # TestClient 在返回响应前会执行完后台任务
+    job_resp = client.get(f"/api/documents/upload/{job['job_id']}", headers=super_admin_headers)
+    assert job_resp.status_code == 200
+    body = job_resp.json()["data"]
+    assert body["status"] == "completed"
     assert body["chunks_created"] == len(fake_rag_service.docs)
 
     delete_resp = client.delete(
@@ -77,12 +97,8 @@ def test_chat_streaming(client, user_headers):
 
     with client.stream("POST", "/api/chat", json={"message": "Hello"}, headers=user_headers) as response:
         assert response.status_code == 200
-        lines = [
-            line.decode() if isinstance(line, bytes) else line
-            for line in response.iter_lines()
-            if line
-        ]
-    assert any("stream chunk" in line for line in lines)
+        body = response.read()
+    assert b"stream chunk" in body
 
 
 def test_reset_clears_documents(client, super_admin_headers):
@@ -0,0 +1,43 @@
+import pytest
+
+from app.core import auth
+from app.services.key_store import APIKeyStore
+
+
+@pytest.fixture
+def counting_store(tmp_path, monkeypatch):
+    """独立的 key 存储，并记录 verify_key 的调用次数（即实际查库次数）"""
+    store = APIKeyStore(str(tmp_path / "keys.db"))
+    calls = []
+    verify_key = store.verify_key
+
+    def counting_verify_key(raw_key, key_hash=None):
+        calls.append(raw_key)
+        return verify_key(raw_key, key_hash=key_hash)
+
+    monkeypatch.setattr(store, "verify_key", counting_verify_key)
+    monkeypatch.setattr(auth, "key_store", store)
+    auth.invalidate_api_key_cache()
+    yield store, calls
+    auth.invalidate_api_key_cache()
+
+
+def test_invalid_key_is_served_from_negative_cache(counting_store):
+    store, calls = counting_store
+
+    assert auth._verify_api_key_cached("not-a-key") is None
+    assert auth._verify_api_key_cached("not-a-key") is None
+    assert calls == ["not-a-key"]
+    assert store.hash_key("not-a-key") in auth._negative_cache
+
+
+def test_valid_key_is_never_negatively_cached(counting_store):
+    store, calls = counting_store
+    api_key = store.create_key("user", label="cached")["api_key"]
+
+    first = auth._verify_api_key_cached(api_key)
+    assert first["label"] == "cached"
+    assert auth._verify_api_key_cached(api_key) == first
+    assert calls == [api_key]
+    assert store.hash_key(api_key) not in auth._negative_cache
+    assert store.hash_key(api_key) in auth._verify_cache
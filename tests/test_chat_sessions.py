@@ -1,57 +1,126 @@
+import asyncio
+import json
 
-def test_chat_session_management(client, user_headers):
+import pytest
+
+from app.services.chat_store import chat_store
+from app.services.key_store import key_store
+
+_DATA_PREFIX = b"data: "
+
+
+def _first_sse_event(raw: bytes) -> dict:
+    """只解析第一个 SSE 事件：定位首个空行，直接对 bytes 切片调用 json.loads，不逐行解码"""
+    assert raw.startswith(_DATA_PREFIX)
+    return json.loads(raw[len(_DATA_PREFIX):raw.find(b"\n\n")])
+
+
+@pytest.mark.slow
+@pytest.mark.anyio
+async def test_chat_session_management(async_client, user_headers):
     # 1. Create a session implicitly via chat
-    chat_resp = client.post("/api/chat", json={"message": "Hello Session"}, headers=user_headers)
+    chat_resp = await async_client.post("/api/chat", json={"message": "Hello Session"}, headers=user_headers)
     assert chat_resp.status_code == 200
     # The response is a stream, we need to read it to trigger side effects (saving message)
-    # and get the session_id
-    lines = [
-        line.decode() if isinstance(line, bytes) else line
-        for line in chat_resp.iter_lines()
-        if line
-    ]
-    
-    # Parse session_id from the first chunk
-    import json
-    first_chunk = json.loads(lines[0].replace("data: ", ""))
+    # and get the session_id. The client has already buffered the body, so parse the first
+    # event straight from the raw bytes instead of scanning it line by line.
+    first_chunk = _first_sse_event(chat_resp.content)
     assert "session_id" in first_chunk
     session_id = first_chunk["session_id"]
-    
-    # 2. List sessions
-    list_resp = client.get("/api/chat/sessions", headers=user_headers)
+    # 流结束前本轮消息已写库，无需等待后台任务
+
+    # 2-3. List sessions & get messages（两次读取互不依赖，并发发出）
+    list_resp, msgs_resp = await asyncio.gather(
+        async_client.get("/api/chat/sessions", headers=user_headers),
+        async_client.get(f"/api/chat/sessions/{session_id}/messages", headers=user_headers),
+    )
     assert list_resp.status_code == 200
     sessions = list_resp.json()["data"]
     assert len(sessions) > 0
     assert sessions[0]["id"] == session_id
-    
-    # 3. Get messages
-    msgs_resp = client.get(f"/api/chat/sessions/{session_id}/messages", headers=user_headers)
+
     assert msgs_resp.status_code == 200
     messages = msgs_resp.json()["data"]
     # Should have user message and assistant message
-    # Note: Assistant message is saved AFTER streaming. 
-    # Since we consumed the stream in `lines = ...`, the background task/post-yield code should have run.
-    # However, `chat_store.add_message` is called after the loop.
     assert len(messages) >= 2
     assert messages[0]["role"] == "user"
     assert messages[0]["content"] == "Hello Session"
     assert messages[1]["role"] == "assistant"
-    
+
     # 4. Chat with existing session
-    chat_resp_2 = client.post("/api/chat", json={"message": "Follow up", "session_id": session_id}, headers=user_headers)
+    chat_resp_2 = await async_client.post(
+        "/api/chat", json={"message": "Follow up", "session_id": session_id}, headers=user_headers
+    )
     assert chat_resp_2.status_code == 200
-    # Consume stream
-    list(chat_resp_2.iter_lines())
-    
-    msgs_resp_2 = client.get(f"/api/chat/sessions/{session_id}/messages", headers=user_headers)
+    assert chat_resp_2.content
+
+    msgs_resp_2 = await async_client.get(f"/api/chat/sessions/{session_id}/messages", headers=user_headers)
     messages_2 = msgs_resp_2.json()["data"]
     assert len(messages_2) >= 4 # 2 previous + 2 new
-    
+
     # 5. Delete session
-    del_resp = client.delete(f"/api/chat/sessions/{session_id}", headers=user_headers)
+    del_resp = await async_client.delete(f"/api/chat/sessions/{session_id}", headers=user_headers)
     assert del_resp.status_code == 200
-    
+
     # 6. Verify deletion
-    list_resp_after = client.get("/api/chat/sessions", headers=user_headers)
+    list_resp_after = await async_client.get("/api/chat/sessions", headers=user_headers)
     sessions_after = list_resp_after.json()["data"]
     assert not any(s["id"] == session_id for s in sessions_after)
+
+
+def test_list_sessions(client, user_headers, seeded_session):
+    list_resp = client.get("/api/chat/sessions", headers=user_headers)
+    assert list_resp.status_code == 200
+    sessions = list_resp.json()["data"]
+    assert [s["id"] for s in sessions] == [seeded_session["id"]]
+    assert "api_key_id" not in sessions[0]
+
+
+def test_get_messages(client, user_headers, seeded_session):
+    msgs_resp = client.get(f"/api/chat/sessions/{seeded_session['id']}/messages", headers=user_headers)
+    assert msgs_resp.status_code == 200
+    messages = msgs_resp.json()["data"]
+    assert [(m["role"], m["content"]) for m in messages] == [
+        ("user", "Hello Session"),
+        ("assistant", "stream chunk"),
+    ]
+
+
+def test_followup_chat(client, user_headers, seeded_session):
+    session_id = seeded_session["id"]
+    chat_resp = client.post("/api/chat", json={"message": "Follow up", "session_id": session_id}, headers=user_headers)
+    assert chat_resp.status_code == 200
+    assert _first_sse_event(chat_resp.content) == {"session_id": session_id}
+
+    # 读接口的序列化已由 test_get_messages 覆盖，这里直接读取存储
+    messages = chat_store.get_messages(session_id)
+    assert [m["role"] for m in messages] == ["user", "assistant", "user", "assistant"]
+    assert messages[2]["content"] == "Follow up"
+
+
+def test_retrieval_failure_leaves_no_session(client, user_api_key, user_headers, fake_rag_service, monkeypatch):
+    def failing_query(*args, **kwargs):
+        raise RuntimeError("retrieval failed")
+
+    monkeypatch.setattr(fake_rag_service, "query_texts", failing_query)
+    with pytest.raises(RuntimeError):
+        client.post("/api/chat", json={"message": "Hi"}, headers=user_headers)
+
+    api_key_id = key_store.verify_key(user_api_key)["id"]
+    assert chat_store.list_sessions(api_key_id) == []
+
+
+def test_chat_unknown_session(client, user_headers):
+    chat_resp = client.post("/api/chat", json={"message": "Hi", "session_id": "missing"}, headers=user_headers)
+    assert chat_resp.status_code == 404
+
+
+def test_delete_session(client, user_headers, seeded_session):
+    session_id = seeded_session["id"]
+    del_resp = client.delete(f"/api/chat/sessions/{session_id}", headers=user_headers)
+    assert del_resp.status_code == 200
+
+    assert chat_store.get_session(session_id, seeded_session["api_key_id"]) is None
+    assert chat_store.get_messages(session_id) == []
+    missing_resp = client.delete(f"/api/chat/sessions/{session_id}", headers=user_headers)
+    assert missing_resp.status_code == 404
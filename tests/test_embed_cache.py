@@ -0,0 +1,16 @@
+from app.services.embed_cache import EmbeddingCache
+
+
+def test_cached_vectors_round_trip(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embed.db"), "model-a")
+    assert cache.get_many(["a", "b"]) == [None, None]
+
+    cache.put_many(["a"], [[0.5, 0.25]])
+    assert cache.get_many(["a", "b"]) == [[0.5, 0.25], None]
+
+
+def test_cache_is_keyed_by_model(tmp_path):
+    db_path = str(tmp_path / "embed.db")
+    EmbeddingCache(db_path, "model-a").put_many(["a"], [[1.0]])
+
+    assert EmbeddingCache(db_path, "model-b").get_many(["a"]) == [None]
@@ -0,0 +1,66 @@
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from app.api.routes.documents import _parse_pdf
+from app.utils.file_parsers import PDF_PAGES_PER_TASK, parse_pdf, parse_pdf_pages
+
+
+def _make_pdf(pages) -> bytes:
+    """按页面描述生成内存中的 PDF：字符串为文本页，"<image>" 为纯图片页，None 为空白页"""
+    doc = fitz.open()
+    for content in pages:
+        page = doc.new_page()
+        if content == "<image>":
+            pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 8, 8), False)
+            pixmap.clear_with(200)
+            page.insert_image(fitz.Rect(50, 50, 150, 150), pixmap=pixmap)
+        elif content is not None:
+            page.insert_text((72, 72), content)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def test_pages_without_text_are_skipped(tmp_path):
+    path = tmp_path / "mixed.pdf"
+    path.write_bytes(_make_pdf(["Text page", "<image>", None]))
+
+    text, skipped = parse_pdf_pages(str(path))
+    assert text.strip() == "Text page"
+    # 页码从 1 开始，扫描图片页与空白页都视为无文本
+    assert skipped == [2, 3]
+    assert parse_pdf(path.read_bytes()).strip() == "Text page"
+
+
+@pytest.mark.anyio
+async def test_parse_pdf_splits_page_ranges_in_order(tmp_path):
+    # 页数不是 PDF_PAGES_PER_TASK 的整数倍，最后一个区间不满
+    page_count = PDF_PAGES_PER_TASK * 2 + 3
+    blank_pages = {1, PDF_PAGES_PER_TASK + 1, page_count}
+    path = tmp_path / "long.pdf"
+    path.write_bytes(
+        _make_pdf([None if i in blank_pages else f"page {i}" for i in range(1, page_count + 1)])
+    )
+
+    text, skipped = await _parse_pdf(str(path))
+    assert text.split() == [
+        token for i in range(1, page_count + 1) if i not in blank_pages for token in ("page", str(i))
+    ]
+    assert skipped == sorted(blank_pages)
+
+
+def test_upload_reports_pages_without_text(client, super_admin_headers):
+    upload_resp = client.post(
+        "/api/documents/upload",
+        files={"file": ("mixed.pdf", _make_pdf(["Text page", "<image>", None]), "application/pdf")},
+        headers=super_admin_headers,
+    )
+    assert upload_resp.status_code == 202
+    job_id = upload_resp.json()["data"]["job_id"]
+
+    # TestClient 在返回响应前会执行完后台任务
+    job = client.get(f"/api/documents/upload/{job_id}", headers=super_admin_headers).json()["data"]
+    assert job["status"] == "completed"
+    assert job["skipped_pages"] == [2, 3]
+    assert job["warning"] == "2 个页面没有文本内容，已跳过"
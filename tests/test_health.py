@@ -1,6 +1,11 @@
-def test_health_endpoint(client):
-    """Health endpoint should be accessible without authentication"""
-    response = client.get("/api/health")
+import pytest
+
+
+@pytest.mark.parametrize("headers_fixture", [None, "user_headers", "admin_headers"])
+def test_health_endpoint(client, request, headers_fixture):
+    """Health endpoint should be accessible with or without authentication"""
+    headers = request.getfixturevalue(headers_fixture) if headers_fixture else None
+    response = client.get("/api/health", headers=headers)
     assert response.status_code == 200
     data = response.json()
     assert data["code"] == "200"
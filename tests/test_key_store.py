@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+
+from app.services.key_store import APIKeyStore
+
+
+def _insert_legacy_key(store: APIKeyStore, raw_key: str) -> None:
+    """模拟切换到 BLAKE3 之前创建的 key：以旧的 sha256 哈希写入"""
+    with store._conn:
+        store._conn.execute(
+            "INSERT INTO api_keys (key_hash, role, label, created_at) VALUES (?, ?, ?, ?)",
+            (store._legacy_hash_key(raw_key), "user", "legacy", datetime.now(timezone.utc).isoformat()),
+        )
+
+
+def _stored_hashes(store: APIKeyStore) -> list:
+    return [row["key_hash"] for row in store._conn.execute("SELECT key_hash FROM api_keys")]
+
+
+def test_legacy_key_is_migrated_on_verify(tmp_path):
+    store = APIKeyStore(str(tmp_path / "keys.db"))
+    _insert_legacy_key(store, "legacy-key")
+
+    record = store.verify_key("legacy-key")
+    assert record is not None
+    assert record["role"] == "user"
+    assert record["label"] == "legacy"
+    assert _stored_hashes(store) == [store.hash_key("legacy-key")]
+
+    # 改写后按新哈希直接命中
+    assert store.verify_key_hash(store.hash_key("legacy-key")) == record
+
+
+def test_unknown_key_does_not_write(tmp_path):
+    store = APIKeyStore(str(tmp_path / "keys.db"))
+    _insert_legacy_key(store, "legacy-key")
+    changes_before = store._conn.total_changes
+
+    assert store.verify_key("unknown-key") is None
+    assert store._conn.total_changes == changes_before
+    assert _stored_hashes(store) == [store._legacy_hash_key("legacy-key")]
+
+
+def test_create_keys_in_bulk(tmp_path):
+    store = APIKeyStore(str(tmp_path / "keys.db"))
+
+    created = store.create_keys("user", 5, label="bulk")
+    assert len(created) == 5
+    assert len({item["api_key"] for item in created}) == 5
+    for item in created:
+        record = store.verify_key(item["api_key"])
+        assert record["role"] == "user"
+        assert record["label"] == "bulk"
+    assert len(store.list_keys()["items"]) == 5
@@ -0,0 +1,61 @@
+from app.services.semantic_cache import SemanticCache
+
+
+def test_similar_query_hits_cache():
+    cache = SemanticCache(max_size=4, threshold=0.95, ttl=60)
+    cache.put([1.0, 0.0], 3, ["doc"], cache.generation)
+
+    assert cache.get([0.99, 0.01], 3) == ["doc"]
+    assert cache.get([0.0, 1.0], 3) is None
+    assert cache.get([1.0, 0.0], 5) is None
+
+
+def test_closer_entry_with_other_k_does_not_shadow_match():
+    cache = SemanticCache(max_size=4, threshold=0.95, ttl=60)
+    cache.put([0.99, 0.01], 3, ["k3"], cache.generation)
+    cache.put([1.0, 0.0], 5, ["k5"], cache.generation)
+
+    assert cache.get([1.0, 0.0], 3) == ["k3"]
+    assert cache.get([1.0, 0.0], 5) == ["k5"]
+
+
+def test_invalidate_drops_entries_and_stale_writes():
+    cache = SemanticCache(max_size=4, threshold=0.95, ttl=60)
+    generation = cache.generation
+    cache.put([1.0, 0.0], 3, ["doc"], generation)
+
+    cache.invalidate()
+    assert cache.get([1.0, 0.0], 3) is None
+
+    # 变更前发起的检索结果不应写入
+    cache.put([1.0, 0.0], 3, ["stale"], generation)
+    assert cache.get([1.0, 0.0], 3) is None
+
+
+def test_evicts_least_recently_used():
+    cache = SemanticCache(max_size=2, threshold=0.95, ttl=60)
+    cache.put([1.0, 0.0, 0.0], 3, ["a"], cache.generation)
+    cache.put([0.0, 1.0, 0.0], 3, ["b"], cache.generation)
+    cache.get([1.0, 0.0, 0.0], 3)
+    cache.put([0.0, 0.0, 1.0], 3, ["c"], cache.generation)
+
+    assert cache.get([1.0, 0.0, 0.0], 3) == ["a"]
+    assert cache.get([0.0, 1.0, 0.0], 3) is None
+    assert cache.get([0.0, 0.0, 1.0], 3) == ["c"]
+
+
+def test_expired_entry_is_ignored():
+    cache = SemanticCache(max_size=2, threshold=0.95, ttl=0)
+    cache.put([1.0, 0.0], 3, ["doc"], cache.generation)
+
+    assert cache.get([1.0, 0.0], 3) is None
+
+
+def test_expired_entry_does_not_shadow_live_one():
+    cache = SemanticCache(max_size=4, threshold=0.95, ttl=60)
+    cache.put([1.0, 0.0], 3, ["old"], cache.generation)
+    cache.put([0.99, 0.01], 3, ["live"], cache.generation)
+    # 让最相似的条目过期
+    cache._entries[0][2] = 0
+
+    assert cache.get([1.0, 0.0], 3) == ["live"]